@@ -1,10 +1,27 @@
+import pickle
+import re
 import sqlite3
+from functools import lru_cache
 from typing import Sequence
-from sklearn.feature_extraction.text import TfidfVectorizer
+
+import numpy as np
+from scipy.sparse import csr_matrix
+from sklearn.feature_extraction.text import TfidfVectorizer, strip_accents_unicode
 from sklearn.metrics.pairwise import cosine_similarity
+from sklearn.preprocessing import normalize
+
+import util
+
+try:
+    from numba import njit, prange
+except ImportError:  # numba is optional: fall back to a NumPy GEMV
+    njit = None
 
-# Spanish stopwords (as a LIST, not a set)
-SPANISH_STOPWORDS = [
+# The TF-IDF index is cached next to its database: <db>.tfidf.pkl
+TFIDF_INDEX_SUFFIX = ".tfidf.pkl"
+
+# Spanish stopwords (frozenset for O(1) membership checks)
+SPANISH_STOPWORDS = frozenset({
     "a","al","algo","algunas","algunos","ante","antes","aquel","aquella","aquellas","aquellos","aqui",
     "asi","aun","aunque","bajo","bien","cada","como","con","contra","cual","cuales","cuando","de","del",
     "desde","donde","dos","durante","e","el","ella","ellas","ello","ellos","en","entre","era","erais",
@@ -17,7 +34,15 @@ SPANISH_STOPWORDS = [
     "si","siempre","sin","sobre","sois","solamente","solo","somos","son","soy","su","sus","tal","tambien",
     "tampoco","te","ti","tiene","tienen","toda","todas","todavia","todo","todos","tu","tus","tuya","tuyo",
     "un","una","uno","unos","usted","ustedes","va","vamos","van","vosotras","vosotros","y","ya"
-]
+})
+# sklearn's stop_words parameter only accepts a list; build it once, sorted for determinism
+_STOPWORDS_LIST = sorted(SPANISH_STOPWORDS)
+
+# Same token pattern as TfidfVectorizer's default
+_TOKEN_RE = re.compile(r"(?u)\b\w\w+\b")
+
+def _content_tokens(text: str) -> set:
+    return set(_TOKEN_RE.findall(strip_accents_unicode(text.lower()))) - SPANISH_STOPWORDS
 
 def _tfidf_cosine(texts: Sequence[str]) -> float:
     """
@@ -31,9 +56,12 @@ def _tfidf_cosine(texts: Sequence[str]) -> float:
     # If one is empty and the other is not, similarity is 0
     if not a or not b:
         return 0.0
+    # Cheap prefilter: without a shared non-stopword token the cosine is exactly 0
+    if _content_tokens(a).isdisjoint(_content_tokens(b)):
+        return 0.0
 
     vec = TfidfVectorizer(
-        stop_words=SPANISH_STOPWORDS,
+        stop_words=_STOPWORDS_LIST,
         lowercase=True,
         strip_accents="unicode"
     )
@@ -53,36 +81,184 @@ def _tfidf_cosine(texts: Sequence[str]) -> float:
 def compare_texts(a: str, b: str) -> float:
     return _tfidf_cosine([a, b])
 
+# -------------------------
+# Corpus-wide TF-IDF index
+# -------------------------
+def tfidf_index_path(con: sqlite3.Connection):
+    """Ruta del índice para la base de `con`; None si la base está en memoria."""
+    for _, name, file in con.execute("PRAGMA database_list"):
+        if name == "main":
+            return file + TFIDF_INDEX_SUFFIX if file else None
+    return None
+
+def _fingerprint(con: sqlite3.Connection) -> tuple:
+    # Changes whenever the crawler inserts or re-crawls courses
+    return tuple(con.execute(
+        "SELECT count(*), max(course_id), max(last_crawled_at) FROM courses"
+    ).fetchone())
+
+def build_tfidf_index(con: sqlite3.Connection, path: str = None):
+    """
+    Ajusta un único TfidfVectorizer sobre todos los cursos y guarda en disco
+    (fingerprint, vectorizer, X_csr, id_to_row). Las filas quedan normalizadas (L2),
+    así que el coseno entre dos cursos es solo el producto punto de sus filas.
+    """
+    path = path or tfidf_index_path(con)
+    rows = con.execute("""
+        SELECT course_id,
+               coalesce(title,'') || ' ' || coalesce(description,'') || ' ' ||
+               coalesce(value_proposal,'') || ' ' || coalesce(tutoria,'')
+        FROM courses
+        ORDER BY course_id
+    """).fetchall()
+    vec = TfidfVectorizer(
+        stop_words=_STOPWORDS_LIST,
+        lowercase=True,
+        strip_accents="unicode",
+        dtype=np.float32,
+        sublinear_tf=True,
+    )
+    try:
+        X = vec.fit_transform([text for _, text in rows]).tocsr()
+        normalize(X, copy=False)
+    except ValueError:
+        # No courses, or only stopwords: empty vocabulary -> every similarity is 0.0
+        X = csr_matrix((len(rows), 0), dtype=np.float32)
+    id_to_row = {cid: i for i, (cid, _) in enumerate(rows)}
+
+    if path:
+        try:
+            with open(path, "wb") as f:
+                pickle.dump((_fingerprint(con), vec, X, id_to_row), f,
+                            protocol=pickle.HIGHEST_PROTOCOL)
+        except OSError as e:
+            print(f"[WARN] No se pudo guardar el índice TF-IDF en {path}: {e}")
+    _load_tfidf_index.cache_clear()
+    _dense_matrix.cache_clear()
+    return vec, X, id_to_row
+
+@lru_cache(maxsize=8)
+def _load_tfidf_index(path: str, fingerprint: tuple):
+    """Índice guardado en `path`, o None si no existe o es de otra versión de la base."""
+    try:
+        with open(path, "rb") as f:
+            stored_fp, vec, X, id_to_row = pickle.load(f)
+    except Exception:
+        # Missing, truncated, or written by another sklearn/numpy version: rebuild
+        return None
+    if stored_fp != fingerprint:
+        return None
+    return vec, X, id_to_row
+
+def get_tfidf_index(con: sqlite3.Connection):
+    """Carga el índice cacheado de la base de `con`; lo (re)construye si falta o está desactualizado."""
+    path = tfidf_index_path(con)
+    if path is None:
+        return build_tfidf_index(con)
+    index = _load_tfidf_index(path, _fingerprint(con))
+    if index is None:
+        return build_tfidf_index(con, path)
+    return index
+
+def _course_exists(con: sqlite3.Connection, course_id: int) -> bool:
+    return con.execute("SELECT 1 FROM courses WHERE course_id=?", (course_id,)).fetchone() is not None
+
 def compare_course_ids(con: sqlite3.Connection, id_a: int, id_b: int) -> float:
-    sql = "SELECT title, description, value_proposal, tutoria FROM courses WHERE course_id=?"
-    def get_text(cid: int) -> str:
-        row = con.execute(sql, (cid,)).fetchone()
-        if not row:
-            return ""
-        title, desc, vp, tut = row
-        return " ".join([t for t in (title, desc, vp, tut) if t])
-    return compare_texts(get_text(id_a), get_text(id_b))
+    _, X, id_to_row = get_tfidf_index(con)
+    missing = [cid for cid in (id_a, id_b) if cid not in id_to_row]
+    if missing:
+        if not all(_course_exists(con, cid) for cid in missing):
+            return 0.0
+        # Course exists but isn't indexed yet: rebuild once
+        _, X, id_to_row = build_tfidf_index(con)
+        if id_a not in id_to_row or id_b not in id_to_row:
+            return 0.0
+    i, j = id_to_row[id_a], id_to_row[id_b]
+    sim = float(X[i].multiply(X[j]).sum())
+    return min(max(sim, 0.0), 1.0)
+
+# -------------------------
+# Batch: one course vs. all
+# -------------------------
+if njit is not None:
+    @njit(parallel=True, fastmath=True, cache=True)
+    def _dot(M, v, out):
+        for i in prange(M.shape[0]):
+            s = 0.0
+            for k in range(M.shape[1]):
+                s += M[i, k] * v[k]
+            out[i] = s
+
+@lru_cache(maxsize=8)
+def _dense_matrix(path: str, fingerprint: tuple):
+    index = _load_tfidf_index(path, fingerprint)
+    return _to_dense(index[1]) if index is not None else None
+
+def _to_dense(X) -> np.ndarray:
+    return np.ascontiguousarray(X.toarray(), dtype=np.float32)
+
+def cosine_all_vs_one(con: sqlite3.Connection, course_id: int):
+    """
+    Similitud coseno de un curso contra todos los del índice.
+    Devuelve (course_ids, scores): arreglos alineados, en orden de course_id;
+    ambos vacíos si el curso no está indexado (p. ej. base sin cursos).
+    """
+    _, X, id_to_row = get_tfidf_index(con)
+    if course_id not in id_to_row:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+    # id_to_row is built in course_id order, so its keys are already row-aligned
+    course_ids = np.fromiter(id_to_row.keys(), dtype=np.int64, count=len(id_to_row))
+    if X.shape[1] == 0:
+        # Empty vocabulary: nothing to densify or multiply
+        return course_ids, np.zeros(len(course_ids), dtype=np.float32)
+    path = tfidf_index_path(con)
+    M = _dense_matrix(path, _fingerprint(con)) if path else None
+    if M is None:
+        M = _to_dense(X)
+    v = M[id_to_row[course_id]]
+    if njit is None:
+        out = M @ v
+    else:
+        out = np.empty(M.shape[0], dtype=np.float32)
+        _dot(M, v, out)
+    return course_ids, np.clip(out, 0.0, 1.0, out=out)
 
 # Optional: compare by URL or by "contains in title"
 def compare_course_urls(con: sqlite3.Connection, url_a: str, url_b: str) -> float:
-    ra = con.execute("SELECT course_id FROM courses WHERE url=?", (url_a,)).fetchone()
-    rb = con.execute("SELECT course_id FROM courses WHERE url=?", (url_b,)).fetchone()
-    if not ra or not rb:
+    ra, rb = con.execute(
+        "SELECT (SELECT course_id FROM courses WHERE url=?),"
+        "       (SELECT course_id FROM courses WHERE url=?)",
+        (url_a, url_b)
+    ).fetchone()
+    if ra is None or rb is None:
         return 0.0
-    return compare_course_ids(con, ra[0], rb[0])
+    return compare_course_ids(con, ra, rb)
+
+def _fts_title_phrase(text: str) -> str:
+    # title:"..."* -> phrase restricted to the title column, last token as prefix
+    return 'title:"' + text.replace('"', '""') + '"*'
 
 def compare_course_titles_contains(con: sqlite3.Connection, a_contains: str, b_contains: str) -> float:
-    ra = con.execute(
-        "SELECT course_id FROM courses WHERE title LIKE ? ORDER BY course_id LIMIT 1",
-        (f"%{a_contains}%",)
-    ).fetchone()
-    rb = con.execute(
-        "SELECT course_id FROM courses WHERE title LIKE ? ORDER BY course_id LIMIT 1",
-        (f"%{b_contains}%",)
-    ).fetchone()
-    if not ra or not rb:
+    # Both lookups in a single statement (one round-trip instead of two), through the FTS index
+    fts_sub = ("(SELECT c.course_id FROM courses_fts f JOIN courses c ON c.course_id = f.rowid"
+               " WHERE courses_fts MATCH ? ORDER BY c.course_id LIMIT 1)")
+    like_sub = "(SELECT course_id FROM courses WHERE title LIKE ? ORDER BY course_id LIMIT 1)"
+    try:
+        ra, rb = con.execute(
+            f"SELECT {fts_sub}, {fts_sub}",
+            (_fts_title_phrase(a_contains), _fts_title_phrase(b_contains))
+        ).fetchone()
+    except sqlite3.OperationalError:
+        # No FTS (missing courses_fts or unparsable MATCH string)
+        ra = rb = None
+    # FTS matches whole tokens; keep substring semantics with LIKE for any side it missed
+    if ra is None:
+        ra = con.execute(f"SELECT {like_sub}", (f"%{a_contains}%",)).fetchone()[0]
+    if rb is None:
+        rb = con.execute(f"SELECT {like_sub}", (f"%{b_contains}%",)).fetchone()[0]
+    if ra is None or rb is None:
         return 0.0
-    return compare_course_ids(con, ra[0], rb[0])
+    return compare_course_ids(con, ra, rb)
 
 if __name__ == "__main__":
     import argparse
@@ -93,10 +269,14 @@ if __name__ == "__main__":
     g.add_argument("--urls", nargs=2, metavar=("URL_A","URL_B"))
     g.add_argument("--titles", nargs=2, metavar=("CONTAINS_A","CONTAINS_B"),
                    help="Compara el primer curso cuyo título contenga cada cadena")
+    ap.add_argument("--reindex", action="store_true",
+                    help=f"Reconstruye el índice TF-IDF (<db>{TFIDF_INDEX_SUFFIX}) antes de comparar")
     args = ap.parse_args()
 
-    con = sqlite3.connect(args.db)
+    con = util.open_db(args.db, readonly=True)
     try:
+        if args.reindex:
+            build_tfidf_index(con)
         if args.ids:
             sim = compare_course_ids(con, args.ids[0], args.ids[1])
         elif args.urls:
@@ -1,36 +1,59 @@
 import argparse
 import time
-import sqlite3
+import zlib
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
-from urllib.parse import urljoin
+from functools import lru_cache
+from urllib.parse import urljoin, urlparse
 
+import soupsieve as sv
 from bs4 import BeautifulSoup
+from selectolax.lexbor import LexborHTMLParser as HTMLParser
 from selenium import webdriver
 from selenium.webdriver.chrome.service import Service
 from webdriver_manager.chrome import ChromeDriverManager
+from selenium.common.exceptions import StaleElementReferenceException
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 
+import util
+
 
 START_URL = "https://educacionvirtual.javeriana.edu.co/nuestros-programas-nuevo"
 MAX_PAGES = 69
+MAX_WORKERS = 16
+
+# Catalog selectors, compiled once instead of on every select() call
+_SEL_ITEM = sv.compile("li.item-programa.ais-Hits-item")
+_SEL_TYPE = sv.compile("div.card-type")
+_SEL_BODY_A = sv.compile(".card-body a[href]")
+_SEL_ANY_A = sv.compile("a[href]")
+FIRST_TITLE_CSS = "li.item-programa .card-body b.card-title"
 
 
 # -------------------------
 # BD Utilities
 # -------------------------
 def init_db(db_path: str):
-    con = sqlite3.connect(db_path)
-    con.execute("PRAGMA foreign_keys=ON")
-    return con
+    return util.open_db(db_path)
+
 
+COLS = (
+    "url", "title", "category", "modality", "duration", "price", "start_date", "location",
+    "value_proposal", "tutoria", "description", "raw_html", "last_crawled_at",
+)
+BATCH_SIZE = 25
 
-def upsert_course(con, row):
+
+def upsert_courses(con, rows):
     """
-    row = dict(url, title, category, modality, duration, price, start_date, location,
-               value_proposal, tutoria, description, raw_html, last_crawled_at)
+    rows = list of dict(url, title, category, modality, duration, price, start_date, location,
+                        value_proposal, tutoria, description, raw_html, last_crawled_at)
+    Inserts/updates all rows with a single executemany and one commit.
     """
+    if not rows:
+        return
     insert_sql = """
     INSERT INTO courses (
       url, title, category, modality, duration, price, start_date, location,
@@ -50,21 +73,7 @@ def upsert_course(con, row):
       raw_html=excluded.raw_html,
       last_crawled_at=excluded.last_crawled_at
     """
-    con.execute(insert_sql, (
-        row.get("url"),
-        row.get("title"),
-        row.get("category"),
-        row.get("modality"),
-        row.get("duration"),
-        row.get("price"),
-        row.get("start_date"),
-        row.get("location"),
-        row.get("value_proposal"),
-        row.get("tutoria"),
-        row.get("description"),
-        row.get("raw_html"),
-        row.get("last_crawled_at"),
-    ))
+    con.executemany(insert_sql, [tuple(r.get(k) for k in COLS) for r in rows])
     con.commit()
 
 
@@ -87,11 +96,15 @@ def _wait_results_loaded(wait: WebDriverWait):
     wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, "li.item-programa.ais-Hits-item")))
 
 
-def _first_card_title_text(driver) -> str:
-    html = driver.page_source
-    soup = BeautifulSoup(html, "lxml")
-    t = soup.select_one("li.item-programa .card-body b.card-title")
-    return t.get_text(strip=True) if t else ""
+def _card_changed(old_el, old_text: str) -> bool:
+    """
+    True once the first card was re-rendered (element detached) or its title changed.
+    Each check is a single WebDriver call, no page_source transfer.
+    """
+    try:
+        return old_el.text != old_text
+    except StaleElementReferenceException:
+        return True
 
 
 # -------------------------
@@ -103,7 +116,7 @@ def get_cards_on_page(driver):
     """
     html = driver.page_source
     soup = BeautifulSoup(html, "lxml")
-    return soup.select("li.item-programa.ais-Hits-item")
+    return _SEL_ITEM.select(soup)
 
 
 def is_course_card(card_el):
@@ -111,39 +124,52 @@ def is_course_card(card_el):
     En cada card hay un <div class="card-type course ...">Curso</div>.
     Queremos SOLO los que digan 'Curso'.
     """
-    type_div = card_el.select_one("div.card-type")
+    type_div = _SEL_TYPE.select_one(card_el)
     if not type_div:
         return False
     txt = type_div.get_text(strip=True).lower()
     return "curso" in txt
 
 
+@lru_cache(maxsize=None)
+def _origin(base_url: str) -> str:
+    u = urlparse(base_url)
+    return f"{u.scheme}://{u.netloc}"
+
+
 def extract_course_link_from_card(card_el, base_url: str):
     """
     El enlace a la ficha del curso está en el <a href="..."> del título (o de la imagen).
     Preferimos el <a> del título dentro de .card-body; si no, el primero que exista.
     """
-    a = (card_el.select_one(".card-body a[href]") or
-         card_el.select_one("a[href]"))
+    a = (_SEL_BODY_A.select_one(card_el) or
+         _SEL_ANY_A.select_one(card_el))
     if not a:
         return None
     href = a.get("href", "").strip()
     if not href:
         return None
+    # Fast paths for the usual absolute and root-relative (/programa/...) hrefs
+    if href.startswith(("http://", "https://")):
+        return href
+    if href.startswith("/") and not href.startswith("//"):
+        return _origin(base_url) + href
     return urljoin(base_url, href)
 
 
-def iterate_pages_and_collect_links(driver, start_url: str, pages: int, delay: float) -> set:
+def iterate_pages_and_collect_links(driver, start_url: str, pages: int, delay: float) -> dict:
     wait = WebDriverWait(driver, 20)
     driver.get(start_url)
     _wait_results_loaded(wait)
     time.sleep(delay)
 
-    links = set()
-    last_first_title = _first_card_title_text(driver)
+    # dict as an insertion-ordered set: O(1) dedupe, stable iteration without sorting
+    links: dict[str, None] = {}
 
     for i in range(1, pages + 1):
         try:
+            old_first = driver.find_element(By.CSS_SELECTOR, FIRST_TITLE_CSS)
+            old_first_text = old_first.text
             li = wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, f"li#p{i}")))
             a = li.find_element(By.CSS_SELECTOR, "a.page-link")
             driver.execute_script("arguments[0].click();", a)
@@ -151,10 +177,9 @@ def iterate_pages_and_collect_links(driver, start_url: str, pages: int, delay: f
             # Wait for the <li> to have the selected class
             wait.until(lambda d: "ais-Pagination-item--selected" in li.get_attribute("class"))
 
-            # Wait for the first card title to change (to ensure the page actually changed)
-            wait.until(lambda d: _first_card_title_text(d) != last_first_title)
+            # Wait for the first card to change (to ensure the page actually changed)
+            wait.until(lambda d: _card_changed(old_first, old_first_text))
             time.sleep(delay)
-            last_first_title = _first_card_title_text(driver)
 
         except Exception:
             # If i=1 is already selected, or if the site took too long: try to continue
@@ -167,7 +192,7 @@ def iterate_pages_and_collect_links(driver, start_url: str, pages: int, delay: f
                 continue
             link = extract_course_link_from_card(card, start_url)
             if link:
-                links.add(link)
+                links[link] = None
                 found_here += 1
 
         print(f"[p{i:02d}] cursos detectados aquí: {found_here} | acumulado: {len(links)}")
@@ -180,31 +205,46 @@ def iterate_pages_and_collect_links(driver, start_url: str, pages: int, delay: f
 # Course detail page
 # -------------------------
 def _text_or_none(el):
-    return el.get_text(" ", strip=True) if el else None
+    # selectolax keeps whitespace-only text nodes: collapse all runs of whitespace
+    if not el:
+        return None
+    return " ".join(el.text(separator=" ").split()) or None
+
+
+def _find_parent_with_class(node, cls: str):
+    node = node.parent
+    while node is not None:
+        if cls in (node.attributes.get("class") or "").split():
+            return node
+        node = node.parent
+    return None
 
 
 def parse_course_detail(html: str, url: str) -> dict:
-    soup = BeautifulSoup(html, "lxml")
+    tree = HTMLParser(html)
+    # Unlike BeautifulSoup's get_text, selectolax's text() includes script/style contents
+    tree.strip_tags(["script", "style", "template"])
 
     # Title: usually in h2.font-weight-bold.mb-md-0 (fallback to h1/h2)
-    title_el = (soup.select_one("h2.font-weight-bold.mb-md-0") or
-                soup.select_one("h1.font-weight-bold") or
-                soup.select_one("h1, h2"))
+    title_el = (tree.css_first("h2.font-weight-bold.mb-md-0") or
+                tree.css_first("h1.font-weight-bold") or
+                tree.css_first("h1, h2"))
     title = _text_or_none(title_el) or ""
 
     # Price: <span class="course-price"><div>$ ...</div></span>
-    price = _text_or_none(soup.select_one("span.course-price"))
+    price = _text_or_none(tree.css_first("span.course-price"))
 
     # Sidebar: NIVEL, DURACIÓN, TUTORÍA, INICIO (each as h6 + value in .col > div)
+    sidebar_labels = tree.css("h6.font-title-color.m-0")
+
     def read_sidebar_value(label_text: str):
-        h6 = soup.find("h6", class_="font-title-color m-0",
-                       string=lambda s: s and label_text.lower() in s.lower())
+        h6 = next((h for h in sidebar_labels if label_text.lower() in h.text().lower()), None)
         if not h6:
             return None
-        row = h6.find_parent(class_="row")
+        row = _find_parent_with_class(h6, "row")
         if not row:
             return None
-        val = row.select_one(".col > div")
+        val = row.css_first(".col > div")
         return _text_or_none(val)
 
     category   = read_sidebar_value("NIVEL")        # requested as 'category'
@@ -216,19 +256,19 @@ def parse_course_detail(html: str, url: str) -> dict:
     location   = None     
 
     # Value proposition: block with specific class
-    vp_block = soup.select_one(".course-wrapper-seccion.course-wrapper-content--proposal")
+    vp_block = tree.css_first(".course-wrapper-seccion.course-wrapper-content--proposal")
     value_proposal = None
     if vp_block:
-        header = vp_block.find(class_="font-weight-bold text-primary")
+        header = vp_block.css_first(".font-weight-bold.text-primary")
         if header:
             header.decompose()
         value_proposal = _text_or_none(vp_block)
 
     # Description (Program presentation)
-    desc_block = soup.select_one(".course-wrapper-seccion.course-wrapper-content--presentation")
+    desc_block = tree.css_first(".course-wrapper-seccion.course-wrapper-content--presentation")
     description = None
     if desc_block:
-        header = desc_block.find(class_="font-weight-bold text-primary")
+        header = desc_block.css_first(".font-weight-bold.text-primary")
         if header:
             header.decompose()
         description = _text_or_none(desc_block)
@@ -254,41 +294,69 @@ def parse_course_detail(html: str, url: str) -> dict:
 def crawl(args):
     con = init_db(args.db)
     driver = open_driver(headless=not args.show)
+    batch = []
 
     try:
         # 1) collect course links from the catalog (pagination p1..p{pages})
         course_links = iterate_pages_and_collect_links(driver, args.start, args.pages, args.delay)
         print(f"Total de enlaces de cursos: {len(course_links)}")
 
-        # 2) visit course detail pages and save
+        # 2) fetch course detail pages concurrently over HTTP and save (in batches of BATCH_SIZE)
         visited = 0
-        for link in sorted(course_links):
-            try:
-                driver.get(link)
-                time.sleep(args.delay)  # brief wait for rendering
-                detail_html = driver.page_source
-                data = parse_course_detail(detail_html, link)
-                data["raw_html"] = detail_html if args.save_html else None
-                data["last_crawled_at"] = datetime.utcnow().isoformat(timespec="seconds") + "Z"
-
-                if not data["title"]:
-                    print(f"[SKIP] Sin título: {link}")
-                    continue
-
-                upsert_course(con, data)
-                visited += 1
-                if visited % 10 == 0:
-                    print(f"Guardados: {visited}/{len(course_links)}")
-                time.sleep(0.2)
-
-            except Exception as e:
-                print(f"[ERROR] {link}: {e}")
-
+        ex = ThreadPoolExecutor(max_workers=args.workers)
+        try:
+            futures = {ex.submit(util.get_request, u): u for u in course_links}
+            for f in as_completed(futures):
+                link = futures[f]
+                try:
+                    try:
+                        detail_html = util.read_request(f.result())
+                        data = parse_course_detail(detail_html, link)
+                    except Exception as e:
+                        # 403/WAF block, timeout, retries exhausted, ...
+                        print(f"[WARN] {link}: descarga HTTP falló ({e}); reintentando con Selenium")
+                        data = None
+                    if data is None or not data["title"]:
+                        # The download failed or the page needs JS rendering: fall back to Selenium
+                        driver.get(link)
+                        time.sleep(args.delay)
+                        detail_html = driver.page_source
+                        data = parse_course_detail(detail_html, link)
+                    data["raw_html"] = zlib.compress(detail_html.encode("utf-8"), 6) if args.save_html else None
+                    data["last_crawled_at"] = datetime.utcnow().isoformat(timespec="seconds") + "Z"
+
+                    if not data["title"]:
+                        print(f"[SKIP] Sin título: {link}")
+                        continue
+
+                    batch.append(data)
+                    if len(batch) >= BATCH_SIZE:
+                        upsert_courses(con, batch)
+                        visited += len(batch)
+                        batch.clear()
+                        print(f"Guardados: {visited}/{len(course_links)}")
+
+                except Exception as e:
+                    print(f"[ERROR] {link}: {e}")
+        finally:
+            # On Ctrl-C or an escaping error, drop the queued downloads instead of waiting for them
+            ex.shutdown(wait=True, cancel_futures=True)
+
+        upsert_courses(con, batch)
+        visited += len(batch)
+        batch.clear()
         print(f"Listo. Cursos guardados/actualizados: {visited}")
 
     finally:
-        driver.quit()
-        con.close()
+        # Don't lose already-scraped rows if the crawl is interrupted; a failed flush
+        # must not mask the original error nor leak Chrome / the connection
+        try:
+            upsert_courses(con, batch)
+        except Exception as e:
+            print(f"[ERROR] No se pudieron guardar {len(batch)} cursos pendientes: {e}")
+        finally:
+            driver.quit()
+            con.close()
 
 
 def main():
@@ -297,7 +365,9 @@ def main():
     ap.add_argument("--start", default=START_URL)
     ap.add_argument("--pages", type=int, default=MAX_PAGES)
     ap.add_argument("--delay", type=float, default=1.0, help="Segundos entre acciones")
-    ap.add_argument("--save-html", action="store_true", help="Guardar raw_html")
+    ap.add_argument("--workers", type=int, default=MAX_WORKERS,
+                    help="Descargas concurrentes de páginas de detalle")
+    ap.add_argument("--save-html", action="store_true", help="Guardar raw_html (comprimido con zlib)")
     ap.add_argument("--show", action="store_true", help="Mostrar navegador (quit headless)")
     args = ap.parse_args()
     crawl(args)
@@ -1,32 +1,61 @@
 import argparse
 import sqlite3
 
-def get_synonyms(con, term: str) -> set:
-    synonyms = set()
-    t = term.strip().lower()
-    row = con.execute("SELECT term_id FROM terms WHERE lower(term)=?", (t,)).fetchone()
-    if not row:
-        return synonyms
-    term_id = row[0]
-    for (syn,) in con.execute("SELECT synonym FROM synonyms WHERE term_id=?", (term_id,)):
+import util
+
+# con -> {term: {synonym, ...}}, loaded once per connection.
+# Keyed by the connection object itself (not id(con), which is recycled after close);
+# entries of closed connections are dropped whenever a new one is loaded.
+_SYN_CACHE: dict[sqlite3.Connection, dict[str, set[str]]] = {}
+# con -> {term: '(term OR "syn" ...)'}, dropped together with the synonym table
+_GROUP_CACHE: dict[sqlite3.Connection, dict[str, str]] = {}
+
+def _is_closed(con) -> bool:
+    try:
+        con.total_changes
+        return False
+    except sqlite3.ProgrammingError:
+        return True
+
+def _load_synonyms(con) -> dict[str, set[str]]:
+    table: dict[str, set[str]] = {}
+    sql = "SELECT t.term, s.synonym FROM terms t LEFT JOIN synonyms s ON s.term_id = t.term_id"
+    for term, syn in con.execute(sql):
+        syns = table.setdefault(term.strip().lower(), set())
         if syn:
-            synonyms.add(syn.strip().lower())
-    return synonyms
+            syns.add(syn.strip().lower())
+    return table
+
+def _synonym_table(con) -> dict[str, set[str]]:
+    table = _SYN_CACHE.get(con)
+    if table is None:
+        for old in [c for c in _SYN_CACHE if _is_closed(c)]:
+            del _SYN_CACHE[old]
+            _GROUP_CACHE.pop(old, None)
+        table = _SYN_CACHE[con] = _load_synonyms(con)
+        _GROUP_CACHE[con] = {}
+    return table
+
+def get_synonyms(con, term: str) -> set:
+    return set(_synonym_table(con).get(term.strip().lower(), ()))
+
+def _term_group(con, term: str) -> str:
+    """'(term OR "syn 1" OR ...)' for an already lowercased term, memoized per connection."""
+    table = _synonym_table(con)
+    groups = _GROUP_CACHE[con]
+    group = groups.get(term)
+    if group is None:
+        parts = {term} | table.get(term, set())
+        parts_q = [f'"{p}"' if " " in p else p for p in sorted(parts)]
+        group = groups[term] = "(" + " OR ".join(parts_q) + ")"
+    return group
 
 def build_fts_query(terms: list, con: sqlite3.Connection) -> str:
     """
     Crea el MATCH de FTS combinando término + sinónimos con OR.
     E.g.: (ia OR "inteligencia artificial") OR (python)
     """
-    groups = []
-    for t in terms:
-        t = t.strip()
-        if not t:
-            continue
-        syns = get_synonyms(con, t)
-        parts = {t.lower()} | {s.lower() for s in syns}
-        parts_q = [f'"{p}"' if " " in p else p for p in parts]
-        groups.append("(" + " OR ".join(parts_q) + ")")
+    groups = [_term_group(con, t.strip().lower()) for t in terms if t.strip()]
     return " OR ".join(groups) if groups else ""
 
 def search(con, interests: list, top: int = 20):
@@ -64,7 +93,7 @@ def main():
     args = ap.parse_args()
 
     interests = [t.strip() for t in args.intereses.split(",")]
-    con = sqlite3.connect(args.db)
+    con = util.open_db(args.db, readonly=True)
     rows = search(con, interests, args.top)
     for url, title, score in rows:
         print(f"- {title}  (score={score})\n  {url}\n")
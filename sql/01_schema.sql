@@ -13,7 +13,7 @@ CREATE TABLE IF NOT EXISTS courses (
   value_proposal   TEXT,
   tutoria          TEXT,
   description      TEXT,
-  raw_html         TEXT,
+  raw_html         BLOB,            -- zlib-compressed UTF-8 HTML (util.decompress_html)
   last_crawled_at  TEXT
 );
 
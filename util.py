@@ -0,0 +1,114 @@
+import os
+import sqlite3
+import threading
+import zlib
+from pathlib import Path
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+# -------------------------
+# SQLite
+# -------------------------
+_WRITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+)
+
+_COMMON_PRAGMAS = (
+    "PRAGMA mmap_size=268435456",   # 256 MB
+    "PRAGMA cache_size=-65536",     # 64 MB (negative = KiB)
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA foreign_keys=ON",
+)
+
+
+def open_db(path: str, readonly: bool = False) -> sqlite3.Connection:
+    """
+    Abre la base SQLite con los PRAGMAs de rendimiento del proyecto.
+    readonly=True abre en modo 'ro' (sin locks de escritura ni cambios de journal).
+    """
+    if readonly:
+        uri = Path(path).resolve().as_uri() + "?mode=ro"
+        con = sqlite3.connect(uri, uri=True)
+        pragmas = _COMMON_PRAGMAS
+    else:
+        con = sqlite3.connect(path)
+        pragmas = _WRITE_PRAGMAS + _COMMON_PRAGMAS
+    for pragma in pragmas:
+        con.execute(pragma)
+    return con
+
+
+def create_db(path: str, schema_path: str) -> None:
+    """
+    Crea/actualiza la base con el esquema en una sola transacción y corre ANALYZE
+    para que el planner tenga estadísticas desde el principio.
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(schema_path, "r", encoding="utf-8") as f:
+        schema = f.read()
+    con = open_db(path)
+    try:
+        # executescript commits any open transaction first, so BEGIN/COMMIT go inside the script
+        con.executescript(f"BEGIN;\n{schema}\nANALYZE;\nCOMMIT;")
+    finally:
+        con.close()
+
+
+def decompress_html(blob) -> str:
+    """Inverse of how the crawler stores courses.raw_html (zlib + UTF-8)."""
+    return zlib.decompress(blob).decode("utf-8")
+
+
+# -------------------------
+# HTTP
+# -------------------------
+_SESSION = None
+_SESSION_LOCK = threading.Lock()
+
+# Browser-like UA: the default python-requests one is more likely to be blocked
+USER_AGENT = ("Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+              "(KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36")
+
+
+def _get_session() -> requests.Session:
+    """
+    Sesión HTTP compartida (reutiliza conexiones keep-alive).
+    El pool se dimensiona para las descargas concurrentes del crawler.
+    """
+    global _SESSION
+    with _SESSION_LOCK:
+        if _SESSION is None:
+            session = requests.Session()
+            session.headers.update({
+                "User-Agent": USER_AGENT,
+                "Accept-Language": "es-419,es;q=0.9",
+                "Accept-Encoding": "gzip, deflate",
+                "Connection": "keep-alive",
+            })
+            adapter = HTTPAdapter(
+                pool_connections=32,
+                pool_maxsize=64,
+                max_retries=Retry(total=3, backoff_factor=0.5,
+                                  status_forcelist=(429, 500, 502, 503, 504)),
+            )
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _SESSION = session
+    return _SESSION
+
+
+def get_request(url: str, timeout: float = 30) -> requests.Response:
+    resp = _get_session().get(url, timeout=timeout)
+    resp.raise_for_status()
+    return resp
+
+
+def read_request(resp: requests.Response) -> str:
+    # Fall back to content sniffing when the server doesn't declare a charset
+    if "charset" not in resp.headers.get("Content-Type", "").lower():
+        resp.encoding = resp.apparent_encoding
+    return resp.text